@@ -3,6 +3,7 @@ import sys
 from pathlib import Path
 from src.detector import PedestrianDetector
 from src.video_processor import VideoProcessor
+from src.utils import setup_logging
 
 
 def parse_arguments():
@@ -44,9 +45,31 @@ def parse_arguments():
     parser.add_argument(
         '--device',
         type=str,
-        default='cpu',
-        choices=['cpu', 'cuda', '0', '1'],
-        help='Устройство для запуска инференса'
+        default='auto',
+        choices=['auto', 'cpu', 'cuda', '0', '1'],
+        help='Устройство для запуска инференса (auto - CUDA при наличии)'
+    )
+    parser.add_argument(
+        '--compile',
+        action='store_true',
+        help='Скомпилировать модель через torch.compile под фиксированный размер входа'
+    )
+    parser.add_argument(
+        '--int8',
+        action='store_true',
+        help='Квантовать веса в INT8 для ускорения инференса на CPU'
+    )
+    parser.add_argument(
+        '--stride',
+        type=int,
+        default=1,
+        help='Детектировать каждый N-й кадр (пропущенные кадры повторяют последний аннотированный)'
+    )
+    parser.add_argument(
+        '--motion-threshold',
+        type=float,
+        default=2.0,
+        help='Порог движения для пропуска детекции на статичных кадрах (0 - отключить)'
     )
     parser.add_argument(
         '--imgsz',
@@ -63,7 +86,10 @@ def main():
 
     """Основная функция выполнения."""
     args = parse_arguments()
-    
+
+    # Настройка логирования (прогресс обработки пишется через очередь)
+    setup_logging()
+
     # Проверка существования входного файла
     input_path = Path(args.input)
     if not input_path.exists():
@@ -76,7 +102,9 @@ def main():
         model_name=args.model,
         confidence_threshold=args.confidence,
         device=args.device,
-        imgsz=args.imgsz
+        imgsz=args.imgsz,
+        int8=args.int8,
+        compile_model=args.compile
     )
     
     # Обработка видео
@@ -84,7 +112,9 @@ def main():
     processor = VideoProcessor(detector)
     processor.process_video(
         input_path=str(input_path),
-        output_path=args.output
+        output_path=args.output,
+        sample_stride=args.stride,
+        motion_threshold=args.motion_threshold
     )
     
     print(f"Обработка завершена! Результат сохранен в: {args.output}")
@@ -3,77 +3,322 @@
 Обработка детекции людей с использованием YOLO
 """
 from ultralytics import YOLO
+import cv2
 import numpy as np
-from typing import List, Tuple
+import torch
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 
 class PedestrianDetector:
     """
     Детектор пешеходов с использованием архитектуры YOLO.
-    
+
     Атрибуты:
         model: экземпляр модели YOLO
         confidence_threshold: минимальная уверенность для валидных детекций
         device: вычислительное устройство (cpu/cuda)
+        half: использовать ли FP16 для инференса (включается на CUDA)
     """
-    
+
     def __init__(
         self,
         model_name: str = 'yolo11n.pt',
         confidence_threshold: float = 0.5,
-        device: str = 'cpu',
+        device: Optional[str] = None,
         imgsz: int = 640,  # Новое поле — размер входного изображения
+        int8: bool = False,
+        compile_model: bool = False,
     ):
-        self.model = YOLO(model_name)
+        # Автоопределение устройства: CUDA при наличии, иначе CPU
+        if device is None or device == 'auto':
+            device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+
+        # Однократный экспорт в TensorRT/ONNX: специализированный движок
+        # загружается из соседнего файла при повторных запусках
+        resolved_name = self._resolve_model_path(model_name, device, imgsz, int8)
+
         self.confidence_threshold = confidence_threshold
         self.device = device
         self.imgsz = imgsz
-        self.model.to(device)
+        # FP16 на CUDA: тензорные ядра дают ~2x к FP32 при минимальной потере mAP
+        self.half = device.startswith('cuda') or device in ('0', '1')
         self.person_class_id = 0
-    
-    def detect(self, frame: np.ndarray) -> List[Tuple]:
+
+        # Загрузка и прогрев модели. Для экспортированных форматов Ultralytics
+        # строит backend лениво: отсутствие onnxruntime или TensorRT
+        # обнаруживается только на первом инференсе, поэтому прогрев входит
+        # в защищенный блок с откатом к исходным весам PyTorch
+        try:
+            self._load_and_warmup(resolved_name, compile_model)
+        except Exception as exc:
+            if resolved_name == model_name:
+                raise
+            print(
+                f"Оптимизированная модель не запустилась ({exc}), "
+                f"возврат к весам PyTorch"
+            )
+            self._load_and_warmup(model_name, compile_model)
+
+        # Отображение идентификаторов классов в имена (для отрисовки меток)
+        self.class_names = self.model.names
+
+    def _load_and_warmup(self, model_path: str, compile_model: bool) -> None:
+        """
+        Загрузка модели с заданного пути и выполнение прогревочных проходов.
+
+        Прогрев делает реальный инференс, поэтому отложенные ошибки
+        backend-а экспортированных моделей проявляются здесь и могут быть
+        перехвачены вызывающим кодом для отката к исходным весам.
+
+        Аргументы:
+            model_path: путь к файлу модели (.pt, .onnx или .engine)
+            compile_model: компилировать ли модель через torch.compile
+
+        Исключения:
+            Exception: любая ошибка загрузки модели или первого инференса
+        """
+        self.model = YOLO(model_path)
+
+        # Перенос на устройство нужен только для весов PyTorch:
+        # экспортированные движки привязаны к устройству при сборке
+        if model_path.endswith('.pt'):
+            self.model.to(self.device)
+
+        # Специализация под фиксированную форму входа через torch.compile:
+        # TorchInductor сливает conv+bn+SiLU в ядра под (B, 3, imgsz, imgsz).
+        # Применимо только к весам PyTorch; компиляция занимает десятки
+        # секунд при первом прогоне, поэтому включается явно
+        self._compiled = False
+        if compile_model and model_path.endswith('.pt'):
+            try:
+                self.model.model = torch.compile(
+                    self.model.model,
+                    mode='reduce-overhead',
+                    fullgraph=False,
+                    dynamic=False
+                )
+                self._compiled = True
+            except Exception as exc:
+                print(f"torch.compile недоступен ({exc}), используется обычный инференс")
+
+        # Прогревочные проходы: инициализация ядер до начала обработки видео
+        # (для скомпилированной модели два прохода, чтобы компиляция
+        # завершилась до первого реального кадра)
+        for _ in range(2 if self._compiled else 1):
+            self.model(
+                np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8),
+                imgsz=self.imgsz,
+                half=self.half,
+                verbose=False
+            )
+
+    @staticmethod
+    def _resolve_model_path(
+        model_name: str, device: str, imgsz: int, int8: bool = False
+    ) -> str:
+        """
+        Подбор оптимизированного файла модели для заданного устройства.
+
+        Для весов PyTorch (.pt) однократно выполняется экспорт: в TensorRT
+        (.engine) на CUDA или в ONNX (.onnx) на CPU. На CPU при int8=True
+        ONNX-модель дополнительно квантуется в INT8 (динамическое
+        квантование onnxruntime), что позволяет использовать VNNI-ядра.
+        Экспортированный файл сохраняется рядом с исходным и
+        переиспользуется при следующих запусках. При любой ошибке
+        экспорта возвращаются исходные веса.
+
+        Аргументы:
+            model_name: путь к файлу модели
+            device: вычислительное устройство (cpu/cuda)
+            imgsz: размер входного изображения (фиксируется в движке)
+            int8: квантовать ли веса в INT8 (только CPU-путь через ONNX)
+
+        Возвращает:
+            Путь к оптимизированному файлу модели или исходный model_name
+        """
+        if not model_name.endswith('.pt'):
+            return model_name
+
+        use_cuda = device.startswith('cuda') or device in ('0', '1')
+
+        # Имя соседнего экспортированного файла
+        suffix = '.engine' if use_cuda else '.onnx'
+        exported = model_name[:-len('.pt')] + suffix
+
+        if not Path(exported).exists():
+            try:
+                if use_cuda:
+                    # TensorRT: слияние ядер и FP16 под фиксированный размер входа
+                    YOLO(model_name).export(
+                        format='engine', half=True, imgsz=imgsz, dynamic=False
+                    )
+                else:
+                    # ONNX: инференс через onnxruntime с SIMD-ядрами для CPU
+                    YOLO(model_name).export(
+                        format='onnx', simplify=True, imgsz=imgsz
+                    )
+            except Exception as exc:
+                print(f"Экспорт модели не удался ({exc}), используются веса PyTorch")
+                return model_name
+
+            if not Path(exported).exists():
+                return model_name
+
+        # Дополнительное INT8-квантование ONNX-модели для CPU
+        if int8 and not use_cuda:
+            quantized = exported[:-len('.onnx')] + '.int8.onnx'
+            if Path(quantized).exists():
+                return quantized
+            try:
+                from onnxruntime.quantization import quantize_dynamic
+                quantize_dynamic(exported, quantized)
+            except Exception as exc:
+                print(f"INT8-квантование не удалось ({exc}), используется FP32 ONNX")
+                return exported
+            if Path(quantized).exists():
+                return quantized
+
+        return exported
+
+    def _downscale(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Уменьшение кадра до размера инференса перед вызовом модели.
+
+        Явное уменьшение через cv2.resize убирает работу letterbox-обвязки
+        Ultralytics над полноразмерным кадром: для 4K-видео это заметная
+        экономия на копировании и интерполяции в Python-обертке.
+
+        Аргументы:
+            frame: входной кадр в виде массива numpy (формат BGR)
+
+        Возвращает:
+            Кортеж (кадр для инференса, масштаб уменьшения); масштаб 1.0
+            означает, что кадр не изменялся
+        """
+        h, w = frame.shape[:2]
+        scale = self.imgsz / max(h, w)
+
+        # Кадр уже не больше размера инференса - уменьшать нечего
+        if scale >= 1.0:
+            return frame, 1.0
+
+        small = cv2.resize(
+            frame,
+            (int(w * scale), int(h * scale)),
+            interpolation=cv2.INTER_LINEAR
+        )
+        return small, scale
+
+    @staticmethod
+    def _rescale_boxes(xyxy: np.ndarray, scale: float) -> np.ndarray:
+        """
+        Пересчет координат bounding boxes обратно в размер исходного кадра.
+
+        Аргументы:
+            xyxy: float массив (N, 4) координат на уменьшенном кадре
+            scale: масштаб, примененный при уменьшении кадра
+
+        Возвращает:
+            int32 массив (N, 4) координат на исходном кадре
+        """
+        if scale != 1.0:
+            xyxy = xyxy / scale
+        return xyxy.astype(np.int32)
+
+    def detect(
+        self, frame: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         Детекция пешеходов в одном кадре.
-        
+
+        Результат возвращается в виде структуры массивов (SoA): координаты,
+        уверенности и классы лежат в отдельных массивах NumPy, поэтому
+        последующая обработка (статистика, NMS) сводится к векторным
+        операциям вместо поэлементных циклов Python.
+
         Аргументы:
             frame: входной кадр в виде массива numpy (формат BGR)
-            
+
         Возвращает:
-            Список кортежей с координатами (x1, y1, x2, y2, уверенность, имя_класса)
+            Кортеж из трех массивов:
+            - boxes: int32 массив (N, 4) с координатами (x1, y1, x2, y2)
+            - confs: float32 массив (N,) с уверенностями
+            - class_ids: int32 массив (N,) с идентификаторами классов
         """
+        # Предварительное уменьшение кадра до размера инференса
+        small, scale = self._downscale(frame)
+
         # Выполнение инференса модели с фильтрацией только класса "person"
         results = self.model(
-        frame,
+        small,
         conf=self.confidence_threshold,
         classes=[self.person_class_id],
         imgsz=self.imgsz,     # Увеличиваем размер входного кадра для инференса
+        half=self.half,
         verbose=False
         )
-        
-        detections = []
-        
-        # Обработка результатов для каждого обнаруженного объекта
-        for result in results:
+
+        # Один общий перенос тензоров на CPU вместо поэлементных вызовов
+        boxes = results[0].boxes
+        xyxy = self._rescale_boxes(boxes.xyxy.cpu().numpy(), scale)
+        confs = boxes.conf.cpu().numpy().astype(np.float32)
+        class_ids = boxes.cls.cpu().numpy().astype(np.int32)
+
+        return (xyxy, confs, class_ids)
+
+    def detect_batch(
+        self, frames: List[np.ndarray]
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Детекция пешеходов сразу в нескольких кадрах одним проходом модели.
+
+        Пакетный инференс амортизирует накладные расходы на запуск ядер
+        и обвязку Ultralytics, поэтому заметно быстрее покадрового вызова.
+        Для каждого кадра возвращается та же структура массивов (SoA),
+        что и у detect.
+
+        Аргументы:
+            frames: список кадров в виде массивов numpy (формат BGR)
+
+        Возвращает:
+            Список кортежей (boxes, confs, class_ids) — по одному на каждый
+            входной кадр, в том же порядке, что и frames
+        """
+        if not frames:
+            return []
+
+        # Предварительное уменьшение каждого кадра до размера инференса
+        small_frames = []
+        scales = []
+        for frame in frames:
+            small, scale = self._downscale(frame)
+            small_frames.append(small)
+            scales.append(scale)
+
+        # Один вызов модели на весь пакет кадров
+        results = self.model(
+            small_frames,
+            conf=self.confidence_threshold,
+            classes=[self.person_class_id],
+            imgsz=self.imgsz,
+            half=self.half,
+            verbose=False
+        )
+
+        batch_detections = []
+
+        # Результаты возвращаются в порядке входных кадров;
+        # тензоры каждого кадра переносятся на CPU одним вызовом
+        for result, scale in zip(results, scales):
             boxes = result.boxes
-            for box in boxes:
-                # Извлечение координат bounding box в формате (x1, y1, x2, y2)
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                
-                # Извлечение уверенности предсказания
-                confidence = float(box.conf[0].cpu().numpy())
-                
-                # Извлечение класса и его имени
-                class_id = int(box.cls[0].cpu().numpy())
-                class_name = result.names[class_id]
-                
-                # Добавление результата в список с преобразованием координат в int
-                detections.append(
-                    (int(x1), int(y1), int(x2), int(y2), 
-                     confidence, class_name)
-                )
-        
-        return detections
-    
+            xyxy = self._rescale_boxes(boxes.xyxy.cpu().numpy(), scale)
+            confs = boxes.conf.cpu().numpy().astype(np.float32)
+            class_ids = boxes.cls.cpu().numpy().astype(np.int32)
+            batch_detections.append((xyxy, confs, class_ids))
+
+        return batch_detections
+
     def get_model_info(self) -> dict:
         """
         Получение информации о загруженной модели.
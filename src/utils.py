@@ -3,43 +3,84 @@
 Функции для преобразования форматов, валидации и логирования
 """
 from pathlib import Path
+import atexit
 import logging
+import logging.handlers
+import queue
 from typing import Tuple, List
 
+import cv2
+import numpy as np
+
+# Numba не является обязательной зависимостью: при ее отсутствии
+# скалярное ядро IoU работает как обычная функция Python
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Заглушка декоратора njit при отсутствии Numba."""
+        def decorator(func):
+            return func
+        # Поддержка вызова как @njit и как @njit(...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return decorator
+
 
 def setup_logging(log_file: str = "pedestrian_detection.log") -> logging.Logger:
     """
     Настройка логирования для приложения.
-    
+
+    Запись ведется через очередь: вызывающий поток только кладет сообщение
+    в очередь (без блокировки на вводе-выводе), а фоновый QueueListener
+    выгружает его в файл и консоль. Это исключает задержки основного
+    потока обработки на синхронной записи в stdout.
+
     Аргументы:
         log_file: путь к файлу логирования
-        
+
     Возвращает:
         Сконфигурированный логгер
     """
     # Создание логгера
     logger = logging.getLogger('PedestrianDetection')
     logger.setLevel(logging.DEBUG)
-    
+
     # Создание обработчика для записи в файл
     file_handler = logging.FileHandler(log_file)
     file_handler.setLevel(logging.DEBUG)
-    
+
     # Создание обработчика для вывода в консоль
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    
+
     # Форматирование сообщений логов
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    
-    # Добавление обработчиков к логгеру
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Неблокирующая запись: логгер кладет записи в неограниченную очередь,
+    # фоновый слушатель выгружает их в файловый и консольный обработчики
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler
+    )
+    listener.start()
+
+    # Остановка слушателя при завершении интерпретатора: stop() дожидается
+    # выгрузки всех записей из очереди, иначе последние сообщения терялись бы
+    atexit.register(listener.stop)
+
+    # Ссылка на слушателя сохраняется на логгере, чтобы его не собрал GC
+    logger.queue_listener = listener
+
     return logger
 
 
@@ -124,127 +165,211 @@ def denormalize_coordinates(
     return (x1, y1, x2, y2)
 
 
-def calculate_iou(
-    bbox1: Tuple[int, int, int, int],
-    bbox2: Tuple[int, int, int, int]
+@njit(cache=True, fastmath=True)
+def _calculate_iou_scalar(
+    x1_min: float, y1_min: float, x1_max: float, y1_max: float,
+    x2_min: float, y2_min: float, x2_max: float, y2_max: float
 ) -> float:
     """
-    Расчет пересечения над объединением (IoU) для двух bounding boxes.
-    
-    Используется для оценки перекрытия между детекциями и для NMS (Non-Maximum Suppression).
-    
+    Скалярное ядро расчета IoU для двух bounding boxes.
+
+    Принимает восемь координат-примитивов вместо кортежей: так Numba
+    компилирует чистую арифметику в короткое машинное ядро без
+    распаковки объектов Python.
+
     Аргументы:
-        bbox1: первый bounding box (x1, y1, x2, y2)
-        bbox2: второй bounding box (x1, y1, x2, y2)
-        
+        x1_min, y1_min, x1_max, y1_max: координаты первого bounding box
+        x2_min, y2_min, x2_max, y2_max: координаты второго bounding box
+
     Возвращает:
         Значение IoU в диапазоне [0, 1]
     """
-    x1_min, y1_min, x1_max, y1_max = bbox1
-    x2_min, y2_min, x2_max, y2_max = bbox2
-    
     # Вычисление координат пересечения
     inter_x_min = max(x1_min, x2_min)
     inter_y_min = max(y1_min, y2_min)
     inter_x_max = min(x1_max, x2_max)
     inter_y_max = min(y1_max, y2_max)
-    
+
     # Вычисление площади пересечения
-    inter_width = max(0, inter_x_max - inter_x_min)
-    inter_height = max(0, inter_y_max - inter_y_min)
+    inter_width = max(0.0, inter_x_max - inter_x_min)
+    inter_height = max(0.0, inter_y_max - inter_y_min)
     inter_area = inter_width * inter_height
-    
+
     # Вычисление площадей bounding boxes
     bbox1_area = (x1_max - x1_min) * (y1_max - y1_min)
     bbox2_area = (x2_max - x2_min) * (y2_max - y2_min)
-    
+
     # Вычисление площади объединения
     union_area = bbox1_area + bbox2_area - inter_area
-    
+
     # Вычисление IoU с защитой от деления на ноль
-    if union_area == 0:
+    if union_area == 0.0:
         return 0.0
-    
-    iou = inter_area / union_area
-    
-    return iou
+
+    return inter_area / union_area
+
+
+def calculate_iou(
+    bbox1: Tuple[int, int, int, int],
+    bbox2: Tuple[int, int, int, int]
+) -> float:
+    """
+    Расчет пересечения над объединением (IoU) для двух bounding boxes.
+
+    Используется для оценки перекрытия между детекциями и для NMS (Non-Maximum Suppression).
+    Тонкая обертка над JIT-компилируемым скалярным ядром: распаковывает
+    кортежи и сохраняет прежний интерфейс для существующих вызовов.
+
+    Аргументы:
+        bbox1: первый bounding box (x1, y1, x2, y2)
+        bbox2: второй bounding box (x1, y1, x2, y2)
+
+    Возвращает:
+        Значение IoU в диапазоне [0, 1]
+    """
+    x1_min, y1_min, x1_max, y1_max = bbox1
+    x2_min, y2_min, x2_max, y2_max = bbox2
+
+    return _calculate_iou_scalar(
+        float(x1_min), float(y1_min), float(x1_max), float(y1_max),
+        float(x2_min), float(y2_min), float(x2_max), float(y2_max)
+    )
+
+
+def _nms_numpy(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float
+) -> np.ndarray:
+    """
+    Векторизованный жадный NMS на NumPy.
+
+    Запасной вариант для сборок OpenCV без модуля dnn: IoU считается
+    широковещательными операциями над массивом координат вместо парных
+    вызовов calculate_iou.
+
+    Аргументы:
+        boxes: float32 массив (N, 4) с координатами (x1, y1, x2, y2)
+        scores: float32 массив (N,) с уверенностями
+        iou_threshold: порог IoU для удаления дублей
+
+    Возвращает:
+        Массив индексов сохраняемых детекций в порядке убывания уверенности
+    """
+    # Предварительный расчет площадей всех bounding boxes
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    # Индексы детекций в порядке убывания уверенности
+    # (один вызов C-кода, без поэлементных сравнений Python)
+    order = np.argsort(-scores)
+
+    keep = []
+
+    # Жадное подавление: берем самую уверенную детекцию и отбрасываем дубли
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+
+        if order.size == 1:
+            break
+
+        rest = order[1:]
+
+        # Координаты пересечения текущей детекции со всеми оставшимися
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+
+        # Площадь пересечения (отрицательные размеры обнуляются)
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+
+        # IoU текущей детекции с каждой из оставшихся
+        union = areas[i] + areas[rest] - inter
+        iou = np.where(union > 0, inter / union, 0.0)
+
+        # Оставляем только детекции с IoU не выше порога
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
 
 
 def filter_detections_by_iou(
-    detections: List[Tuple],
+    detections: Tuple[np.ndarray, np.ndarray, np.ndarray],
     iou_threshold: float = 0.5
-) -> List[Tuple]:
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Фильтрация дублирующихся детекций на основе IoU.
-    
+
     Удаляет детекции с высоким перекрытием, сохраняя ту, у которой выше уверенность.
-    
+    Подавление выполняется нативным ядром cv2.dnn.NMSBoxes (C++/SIMD);
+    при отсутствии модуля dnn используется векторизованный NMS на NumPy.
+
     Аргументы:
-        detections: список детекций (x1, y1, x2, y2, уверенность, имя_класса)
+        detections: кортеж массивов (boxes, confs, class_ids) из детектора
         iou_threshold: порог IoU для удаления дублей
-        
+
     Возвращает:
-        Отфильтрованный список детекций
+        Отфильтрованный кортеж массивов (boxes, confs, class_ids)
+        в порядке убывания уверенности
     """
-    if not detections:
-        return []
-    
-    # Сортировка детекций по уверенности в убывающем порядке
-    sorted_detections = sorted(detections, key=lambda x: x[4], reverse=True)
-    
-    filtered = []
-    
-    # Обработка каждой детекции
-    for detection in sorted_detections:
-        should_keep = True
-        x1, y1, x2, y2, conf, class_name = detection
-        current_bbox = (x1, y1, x2, y2)
-        
-        # Проверка пересечения с уже добавленными детекциями
-        for kept_detection in filtered:
-            kept_x1, kept_y1, kept_x2, kept_y2, _, _ = kept_detection
-            kept_bbox = (kept_x1, kept_y1, kept_x2, kept_y2)
-            
-            # Расчет IoU между текущей и сохраненной детекцией
-            iou = calculate_iou(current_bbox, kept_bbox)
-            
-            # Если IoU выше порога, пропускаем текущую детекцию
-            if iou > iou_threshold:
-                should_keep = False
-                break
-        
-        # Добавление детекции если она не является дублем
-        if should_keep:
-            filtered.append(detection)
-    
-    return filtered
+    det_boxes, det_confs, det_class_ids = detections
 
+    if len(det_confs) == 0:
+        return detections
 
-def get_detection_statistics(detections: List[Tuple]) -> dict:
+    # Координаты и уверенности как массивы с плавающей точкой
+    boxes = det_boxes.astype(np.float32)
+    scores = det_confs.astype(np.float32)
+
+    if hasattr(cv2, 'dnn'):
+        # NMSBoxes принимает боксы в формате (x, y, ширина, высота)
+        xywh = boxes.copy()
+        xywh[:, 2] -= xywh[:, 0]
+        xywh[:, 3] -= xywh[:, 1]
+
+        # Нативное подавление; score_threshold=0 — детектор уже отфильтровал
+        keep = cv2.dnn.NMSBoxes(
+            xywh, scores,
+            score_threshold=0.0,
+            nms_threshold=iou_threshold
+        )
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+
+        # Приведение к порядку убывания уверенности
+        keep = keep[np.argsort(-scores[keep])]
+    else:
+        keep = _nms_numpy(boxes, scores, iou_threshold)
+
+    return (det_boxes[keep], det_confs[keep], det_class_ids[keep])
+
+
+def get_detection_statistics(
+    detections: Tuple[np.ndarray, np.ndarray, np.ndarray]
+) -> dict:
     """
     Расчет статистики по детекциям.
-    
+
     Аргументы:
-        detections: список детекций
-        
+        detections: кортеж массивов (boxes, confs, class_ids) из детектора
+
     Возвращает:
         Словарь со статистикой (количество, средняя уверенность, мин/макс)
     """
-    if not detections:
+    _, confs, _ = detections
+
+    if len(confs) == 0:
         return {
             'count': 0,
             'avg_confidence': 0.0,
             'min_confidence': 0.0,
             'max_confidence': 0.0
         }
-    
-    # Извлечение уверенностей из всех детекций
-    confidences = [det[4] for det in detections]
-    
-    # Расчет статистики
+
+    # Расчет статистики векторными редукциями NumPy
     return {
-        'count': len(detections),
-        'avg_confidence': sum(confidences) / len(confidences),
-        'min_confidence': min(confidences),
-        'max_confidence': max(confidences)
+        'count': int(confs.size),
+        'avg_confidence': float(confs.mean()),
+        'min_confidence': float(confs.min()),
+        'max_confidence': float(confs.max())
     }
\ No newline at end of file
@@ -3,12 +3,50 @@
 Обработка чтения видео, обработки кадров и записи результата
 """
 import cv2
+import logging
 import numpy as np
+import os
 from pathlib import Path
 from typing import Optional
+import queue
+import threading
 import time
 
 
+# Логгер модуля (настраивается через utils.setup_logging)
+logger = logging.getLogger('PedestrianDetection.VideoProcessor')
+
+
+# Кэш размеров текстовых меток: метки имеют вид "person: 0.XX",
+# поэтому различных строк немного (~100) и кэш ограничен по размеру
+_LABEL_SIZE_CACHE = {}
+
+
+def _text_size(label: str) -> tuple:
+    """
+    Расчет размера текстовой метки с мемоизацией.
+
+    cv2.getTextSize для одинаковых строк всегда возвращает одно и то же,
+    поэтому результат кэшируется и пересчет на каждую детекцию не нужен.
+
+    Аргументы:
+        label: текст метки
+
+    Возвращает:
+        Кортеж (ширина, высота) метки в пикселях
+    """
+    size = _LABEL_SIZE_CACHE.get(label)
+    if size is None:
+        size = cv2.getTextSize(
+            label,
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            2
+        )[0]
+        _LABEL_SIZE_CACHE[label] = size
+    return size
+
+
 class VideoProcessor:
     """
     Обработчик видеофайлов с поддержкой детекции пешеходов.
@@ -39,22 +77,49 @@ class VideoProcessor:
         self,
         input_path: str,
         output_path: str,
-        display: bool = False
+        display: bool = False,
+        batch_size: int = 8,
+        prefetch: int = 16,
+        sample_stride: int = 1,
+        motion_threshold: float = 2.0
     ) -> None:
         """
         Обработка видеофайла и сохранение результатов с отрисованными детекциями.
-        
+
+        Обработка построена как трехстадийный конвейер: поток-читатель
+        декодирует кадры в ограниченную очередь, основной поток выполняет
+        пакетную детекцию и отрисовку, поток-писатель кодирует результат.
+        Стадии перекрываются по времени, поэтому декодирование и кодирование
+        почти не добавляют к общему времени обработки.
+
         Аргументы:
             input_path: путь к входному видеофайлу
             output_path: путь для сохранения выходного видео с детекциями
             display: отображать ли процесс обработки в реальном времени (по умолчанию False)
-        
+            batch_size: количество кадров, передаваемых модели за один вызов
+            prefetch: максимальный размер очередей между стадиями конвейера
+            sample_stride: детектировать каждый N-й кадр; промежуточные кадры
+                не декодируются (cap.grab() без retrieve()), а в выходное видео
+                вместо них повторяется последний аннотированный кадр
+            motion_threshold: порог средней попиксельной разницы с предыдущим
+                кадром (по уменьшенной копии в оттенках серого); кадры ниже
+                порога считаются статичными и переиспользуют детекции
+                предыдущего кадра без запуска модели (0 отключает проверку)
+
         Исключения:
             ValueError: если входной видеофайл не может быть открыт
+                или sample_stride меньше 1
         """
-        # Открытие видеофайла через OpenCV
-        cap = cv2.VideoCapture(input_path)
-        
+        # Проверка шага выборки: значение меньше 1 обрушило бы
+        # поток-читатель и навсегда заблокировало конвейер
+        if sample_stride < 1:
+            raise ValueError(
+                f"sample_stride должен быть не меньше 1, получено: {sample_stride}"
+            )
+
+        # Открытие видеофайла через OpenCV (с аппаратным декодированием при наличии)
+        cap = self._open_capture(input_path)
+
         if not cap.isOpened():
             raise ValueError(f"Не удается открыть видеофайл: {input_path}")
         
@@ -67,111 +132,352 @@ class VideoProcessor:
         # Создание директории для выхода если необходимо
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
         
-        # Инициализация видеописателя с кодеком mp4v
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(
-            output_path,
-            fourcc,
-            fps,
-            (frame_width, frame_height)
-        )
+        # Инициализация видеописателя (H.264 с резервным mp4v)
+        out = self._open_writer(output_path, fps, (frame_width, frame_height))
         
         # Инициализация счетчиков и таймера
         frame_count = 0
         start_time = time.time()
         
         # Вывод информации о видео
-        print(f"Информация о видео: {frame_width}x{frame_height} @ {fps}fps")
-        print(f"Всего кадров: {total_frames}")
-        
-        # Основной цикл обработки видео кадр за кадром
-        while True:
-            ret, frame = cap.read()
-            
-            # Выход из цикла при окончании видео
-            if not ret:
-                break
-            
-            # Выполнение детекции пешеходов в текущем кадре
-            detections = self.detector.detect(frame)
-            
-            # Отрисовка bounding boxes и меток на кадр
-            annotated_frame = self._draw_detections(frame, detections)
-            
-            # Запись аннотированного кадра в выходной видеофайл
-            out.write(annotated_frame)
-            
-            # Обновление статистики обработки
-            self._update_stats(detections)
-            
-            frame_count += 1
-            
-            # Периодический вывод прогресса обработки
-            if frame_count % 30 == 0:
-                progress = (frame_count / total_frames) * 100
-                print(f"Прогресс: {progress:.1f}% ({frame_count}/{total_frames})")
-            
-            # Опциональное отображение в реальном времени
-            if display:
-                cv2.imshow('Детекция пешеходов', annotated_frame)
-                # Выход по нажатию клавиши 'q'
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+        logger.info(f"Информация о видео: {frame_width}x{frame_height} @ {fps}fps")
+        logger.info(f"Всего кадров: {total_frames}")
         
+        # Ограниченные очереди между стадиями конвейера (создают back-pressure)
+        read_q = queue.Queue(maxsize=prefetch)
+        write_q = queue.Queue(maxsize=prefetch)
+
+        # Поток-читатель: декодирует кадры и кладет их в read_q
+        reader = threading.Thread(
+            target=self._reader_worker,
+            args=(cap, read_q, sample_stride),
+            daemon=True
+        )
+
+        # Поток-писатель: забирает аннотированные кадры из write_q и кодирует
+        writer = threading.Thread(
+            target=self._writer_worker,
+            args=(out, write_q),
+            daemon=True
+        )
+
+        reader.start()
+        writer.start()
+
+        # Буферы для пакетного инференса: pending хранит кадры в исходном
+        # порядке (None для пропущенных), frames_buf — только кадры для детекции
+        pending = []
+        frames_buf = []
+        last_annotated = None
+        last_detections = None
+        prev_small = None
+        stop_requested = False
+        eof = False
+
+        # Основной цикл: детекция и отрисовка пакетами кадров
+        while not (stop_requested or eof):
+            item = read_q.get()
+
+            # Сигнальное значение означает конец видео
+            if item is None:
+                eof = True
+            else:
+                idx, frame = item
+                run_detect = frame is not None
+
+                # Проверка движения: статичные кадры (малая средняя разница
+                # с предыдущим по уменьшенной серой копии) не детектируются,
+                # для них переиспользуются детекции предыдущего кадра
+                if frame is not None and motion_threshold > 0:
+                    small = cv2.resize(
+                        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                        (64, 36)
+                    )
+                    if prev_small is not None:
+                        diff = np.abs(
+                            small.astype(np.int16) - prev_small.astype(np.int16)
+                        ).mean()
+                        if diff < motion_threshold:
+                            run_detect = False
+                    prev_small = small
+
+                pending.append((idx, frame, run_detect))
+                if run_detect:
+                    frames_buf.append(frame)
+
+                # Пакет сбрасывается при заполнении либо когда в pending
+                # накопилось слишком много статичных/пропущенных кадров
+                if len(frames_buf) < batch_size and len(pending) < prefetch:
+                    continue
+
+            # Обработка накопленного пакета (полного или остатка на конце видео)
+            if pending:
+                batch_detections = self.detector.detect_batch(frames_buf)
+                det_iter = iter(batch_detections)
+
+                # Отрисовка и передача кадров писателю в исходном порядке
+                for idx, buf_frame, run_detect in pending:
+                    if buf_frame is not None:
+                        if run_detect:
+                            detections = next(det_iter)
+                            last_detections = detections
+                        else:
+                            # Статичный кадр: детекции предыдущего кадра
+                            detections = last_detections
+
+                        # Отрисовка выполняется на месте: буфер кадра
+                        # принадлежит конвейеру и больше нигде не читается
+                        if detections is not None:
+                            self._draw_detections(buf_frame, detections)
+
+                            # Обновление статистики обработки
+                            self._update_stats(detections)
+
+                        annotated_frame = buf_frame
+                        last_annotated = annotated_frame
+                    else:
+                        # Пропущенный кадр: повторяем последний аннотированный,
+                        # чтобы сохранить частоту кадров выходного видео
+                        annotated_frame = last_annotated
+
+                    # Передача аннотированного кадра потоку-писателю
+                    if annotated_frame is not None:
+                        write_q.put((idx, annotated_frame))
+
+                    frame_count += 1
+
+                    # Периодический вывод прогресса обработки
+                    # (logger только кладет запись в очередь, без блокировки)
+                    if frame_count % 30 == 0:
+                        progress = (frame_count / total_frames) * 100
+                        logger.info(
+                            f"Прогресс: {progress:.1f}% ({frame_count}/{total_frames})"
+                        )
+
+                    # Опциональное отображение в реальном времени
+                    if display and annotated_frame is not None:
+                        cv2.imshow('Детекция пешеходов', annotated_frame)
+                        # Выход по нажатию клавиши 'q'
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            stop_requested = True
+                            break
+
+                pending = []
+                frames_buf = []
+
+        # Остановка конвейера: читатель завершается сам, писателю шлем сигнал.
+        # Опустошение read_q нужно только до конца видео: после eof сигнальное
+        # значение читателя уже извлечено и повторное ожидание зависло бы
+        if stop_requested and not eof:
+            self._drain_queue(read_q)
+        write_q.put(None)
+        reader.join()
+        writer.join()
+
         # Вычисление времени обработки
         processing_time = time.time() - start_time
         self.stats['processing_time'] = processing_time
         self.stats['total_frames'] = frame_count
-        
+
         # Закрытие ресурсов (видеопотоки и окна)
         cap.release()
         out.release()
         if display:
             cv2.destroyAllWindows()
+
+    def _open_writer(self, output_path: str, fps: int, frame_size: tuple):
+        """
+        Открытие видеописателя с наиболее быстрым доступным кодеком.
+
+        Сначала пробуется H.264 (avc1): при работе детектора на CUDA через
+        переменную окружения OpenCV запрашивается аппаратный кодировщик
+        NVENC, который снимает кодирование с CPU. Если H.264 в данной
+        сборке OpenCV недоступен, выполняется возврат к программному mp4v.
+
+        Аргументы:
+            output_path: путь к выходному видеофайлу
+            fps: частота кадров выходного видео
+            frame_size: размер кадра (ширина, высота)
+
+        Возвращает:
+            Открытый экземпляр cv2.VideoWriter
+        """
+        # Подсказка FFmpeg-обвязке OpenCV использовать NVENC на CUDA-системах
+        # (учитывается только если переменная еще не задана пользователем)
+        if self.detector.device.startswith('cuda'):
+            os.environ.setdefault(
+                'OPENCV_FFMPEG_WRITER_OPTIONS',
+                'video_codec;h264_nvenc'
+            )
+
+        # Порядок предпочтения кодеков: H.264, затем программный mp4v
+        for codec in ('avc1', 'mp4v'):
+            fourcc = cv2.VideoWriter_fourcc(*codec)
+            out = cv2.VideoWriter(output_path, fourcc, fps, frame_size)
+            if out.isOpened():
+                return out
+            out.release()
+
+        raise ValueError(f"Не удается создать выходной видеофайл: {output_path}")
+
+    @staticmethod
+    def _open_capture(input_path: str):
+        """
+        Открытие видеофайла с аппаратным декодированием, если оно доступно.
+
+        Через backend FFmpeg запрашивается любой доступный аппаратный
+        декодер (NVDEC, VA-API, D3D11 - в зависимости от системы), что
+        снимает с CPU самый дорогой этап - программное декодирование
+        H.264/H.265. Если сборка OpenCV не поддерживает параметры
+        аппаратного ускорения или открыть файл не удалось, выполняется
+        обычное программное открытие.
+
+        Аргументы:
+            input_path: путь к входному видеофайлу
+
+        Возвращает:
+            Экземпляр cv2.VideoCapture (возможно, не открытый - проверяется
+            вызывающим кодом через isOpened())
+        """
+        if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            try:
+                cap = cv2.VideoCapture(
+                    input_path,
+                    cv2.CAP_FFMPEG,
+                    [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+                )
+                if cap.isOpened():
+                    return cap
+                cap.release()
+            except cv2.error:
+                pass
+
+        # Резервный вариант: программное декодирование с backend по умолчанию
+        return cv2.VideoCapture(input_path)
+
+    def _reader_worker(
+        self,
+        cap,
+        read_q: queue.Queue,
+        sample_stride: int = 1
+    ) -> None:
+        """
+        Рабочая функция потока-читателя.
+
+        Декодирует кадры из cap и кладет пары (индекс, кадр) в read_q.
+        При sample_stride > 1 декодируется только каждый N-й кадр: остальные
+        продвигаются через cap.grab() без дорогого retrieve() (YUV->BGR
+        декодирование пропускается), и в очередь кладется (индекс, None).
+        По окончании видео кладет сигнальное значение None.
+
+        Аргументы:
+            cap: открытый cv2.VideoCapture
+            read_q: очередь декодированных кадров
+            sample_stride: шаг выборки кадров для детекции
+        """
+        try:
+            idx = 0
+            while True:
+                # grab() только продвигает поток без декодирования кадра
+                if not cap.grab():
+                    break
+
+                if idx % sample_stride == 0:
+                    # Полное декодирование только для кадров, идущих в детектор
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    read_q.put((idx, frame))
+                else:
+                    # Пропущенный кадр: передаем только индекс
+                    read_q.put((idx, None))
+
+                idx += 1
+        finally:
+            # Сигнал конца видео для основного потока; отправляется и при
+            # ошибке декодирования, иначе конвейер заблокируется навсегда
+            read_q.put(None)
+
+    def _writer_worker(self, out, write_q: queue.Queue) -> None:
+        """
+        Рабочая функция потока-писателя.
+
+        Забирает пары (индекс, аннотированный кадр) из write_q и кодирует их
+        в выходной видеофайл. Останавливается по сигнальному значению None.
+
+        Аргументы:
+            out: открытый cv2.VideoWriter
+            write_q: очередь аннотированных кадров
+        """
+        while True:
+            item = write_q.get()
+            if item is None:
+                break
+            out.write(item[1])
+
+    @staticmethod
+    def _drain_queue(q: queue.Queue) -> None:
+        """
+        Опустошение очереди при досрочной остановке конвейера.
+
+        Нужно, чтобы заблокированный на put() поток-читатель мог завершиться.
+
+        Аргументы:
+            q: очередь для опустошения
+        """
+        while True:
+            item = q.get()
+            if item is None:
+                break
     
     def _draw_detections(
         self,
         frame: np.ndarray,
-        detections: list
-    ) -> np.ndarray:
+        detections: tuple
+    ) -> None:
         """
         Отрисовка bounding boxes и меток на кадр.
-        
+
         Каждая детекция отображается с зеленым прямоугольником и черным текстом на зеленом фоне.
-        
+        Отрисовка выполняется прямо в переданном буфере кадра: копирование
+        полного кадра (~6 МБ на 1080p) ради изменения ~1% пикселей было бы
+        чистой потерей пропускной способности памяти.
+
         Аргументы:
-            frame: входной кадр для отрисовки
-            detections: список кортежей детекций (x1, y1, x2, y2, уверенность, имя_класса)
-            
-        Возвращает:
-            Аннотированный кадр с отрисованными детекциями
+            frame: кадр для отрисовки (изменяется на месте)
+            detections: кортеж массивов (boxes, confs, class_ids) из детектора
         """
-        # Копирование кадра для сохранения оригинала
-        annotated = frame.copy()
-        
-        # Обработка каждой детекции
-        for detection in detections:
-            x1, y1, x2, y2, confidence, class_name = detection
-            
-            # Отрисовка зеленого bounding box (толщина 2 пикселя)
-            cv2.rectangle(
-                annotated,
-                (x1, y1),
-                (x2, y2),
-                (0, 255, 0),
-                2
-            )
-            
+        annotated = frame
+
+        boxes, confs, class_ids = detections
+
+        if len(confs) == 0:
+            return
+
+        # Отрисовка всех зеленых bounding boxes одним вызовом polylines:
+        # углы прямоугольников собираются в массив (N, 4, 2), и граница
+        # Python/C++ пересекается один раз вместо одного вызова на бокс
+        x1s, y1s, x2s, y2s = (
+            boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        )
+        pts = np.stack(
+            [x1s, y1s, x2s, y1s, x2s, y2s, x1s, y2s],
+            axis=1
+        ).reshape(-1, 4, 2).astype(np.int32)
+        cv2.polylines(annotated, pts, True, (0, 255, 0), 2)
+
+        # Отрисовка текстовых меток (по одной на детекцию)
+        for i in range(len(confs)):
+            x1, y1 = int(boxes[i, 0]), int(boxes[i, 1])
+            confidence = float(confs[i])
+            class_name = self.detector.class_names[int(class_ids[i])]
+
             # Подготовка текстовой метки с именем класса и уверенностью
             label = f"{class_name}: {confidence:.2f}"
             
-            # Вычисление размера текстовой метки для корректного расположения фона
-            (label_w, label_h), _ = cv2.getTextSize(
-                label,
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                2
-            )
+            # Размер текстовой метки для корректного расположения фона
+            # (кэшируется: набор возможных строк метки ограничен)
+            label_w, label_h = _text_size(label)
             
             # Отрисовка зеленого прямоугольника - фона для текста метки
             cv2.rectangle(
@@ -192,23 +498,22 @@ class VideoProcessor:
                 (0, 0, 0),
                 2
             )
-        
-        return annotated
-    
-    def _update_stats(self, detections: list) -> None:
+
+    def _update_stats(self, detections: tuple) -> None:
         """
         Обновление статистики обработки на основе текущего кадра.
-        
+
         Аргументы:
-            detections: список детекций в текущем кадре
+            detections: кортеж массивов (boxes, confs, class_ids) текущего кадра
         """
+        _, confs, _ = detections
+
         # Увеличение счетчика общего количества детекций
-        self.stats['total_detections'] += len(detections)
-        
-        # Накопление суммы уверенностей для последующего расчета среднего значения
-        for detection in detections:
-            confidence = detection[4]
-            self.stats['total_confidence'] += confidence
+        self.stats['total_detections'] += int(confs.size)
+
+        # Накопление суммы уверенностей одной векторной редукцией
+        # (без поэлементного цикла Python по массиву)
+        self.stats['total_confidence'] += float(confs.sum())
     
     def get_statistics(self) -> dict:
         """